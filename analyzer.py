@@ -0,0 +1,429 @@
+# خط أنابيب التحليل المشترك: دوال نقية بلا أي اعتماد على إطار الويب،
+# كي تستخدمها أي واجهة (Flask أو غيرها) مع طبقة التخزين المؤقت الخاصة بها
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    # numba اختياري: إن وُجد تُصهر اختزالات العد للأعمدة العائمة في نواة
+    # واحدة متوازية بدل تمريرة pandas لكل عمود
+    from numba import njit, prange
+except ImportError:  # pragma: no cover
+    njit = None
+    prange = range
+
+
+if njit is not None:
+
+    @njit(parallel=True, cache=True)
+    def _null_counts_kernel(arr):  # pragma: no cover
+        n, c = arr.shape
+        out = np.zeros(c, np.int64)
+        for j in prange(c):
+            s = 0
+            for i in range(n):
+                if np.isnan(arr[i, j]):
+                    s += 1
+            out[j] = s
+        return out
+
+else:
+    _null_counts_kernel = None
+
+
+@dataclass
+class ColumnStatus:
+    name: str
+    is_complete: bool
+    complete_count: int
+    missing_count: int
+    completion_rate: float
+    dtype: str
+
+
+@dataclass
+class WordResult:
+    name: str
+    count: int
+    percentage: float
+
+
+@dataclass
+class WordExample:
+    name: str
+    row_number: int
+    value: str
+
+
+@dataclass
+class MissingBreakdown:
+    name: str
+    missing_count: int
+    percentage: float
+
+
+@dataclass
+class BaseStats:
+    num_rows: int
+    num_columns: int
+    num_duplicates: int
+    total_missing: int
+    missing_percentage: float
+    complete_columns_count: int
+    complete_columns: List[str]
+    all_columns: List[ColumnStatus]
+    column_names: List[str]
+    columns_to_check: List[str]
+    dtypes: Dict[str, str]
+    missing_breakdown: List[MissingBreakdown]
+
+
+@dataclass
+class DatasetStats:
+    num_rows: int
+    num_columns: int
+    num_duplicates: int
+    total_missing: int
+    missing_percentage: float
+    complete_columns_count: int
+    complete_columns: List[str]
+    all_columns: List[ColumnStatus]
+    filtered_columns: List[ColumnStatus]
+    column_names: List[str]
+    dtypes: Dict[str, str]
+    missing_breakdown: List[MissingBreakdown]
+    word_results: List[WordResult]
+    word_examples: List[WordExample]
+    word_total_occurrences: int
+
+
+# الحقول المستثناة من حساب الأعمدة المكتملة (بترتيب العرض في الواجهة)
+EXCLUDED_COLUMNS_DISPLAY = (
+    "CreatedAt",
+    "ModifiedAt",
+    "DeletedAt",
+    "IsDeleted",
+    "CreatedById",
+    "ModifiedById",
+    "DeletedById",
+    "Governorate",
+)
+
+# مجموعة مجمدة لاختبار العضوية في O(1) بدل مسح قائمة لكل عمود
+EXCLUDED_COLUMNS = frozenset(EXCLUDED_COLUMNS_DISPLAY)
+
+# أعمدة معرّفات مرشحة؛ تفرّد أحدها يثبت استحالة تكرار الصفوف
+PRIMARY_KEY_CANDIDATES = ("Id", "id", "ID")
+
+
+def count_duplicates(df: pd.DataFrame) -> int:
+    # فحص عمود واحد أرخص بكثير من تجزئة الصف بعرضه الكامل
+    for pk in PRIMARY_KEY_CANDIDATES:
+        if pk in df.columns and df[pk].is_unique:
+            return 0
+
+    # تمريرة تجزئة واحدة بدل قناع duplicated الكامل ومقارنات التعادل
+    try:
+        hashes = pd.util.hash_pandas_object(df, index=False)
+    except TypeError:
+        # أنواع غير قابلة للتجزئة: العودة للمسار القديم
+        return int(df.duplicated().sum())
+    return len(hashes) - int(hashes.nunique())
+
+
+def base_stats_from_counts(
+    num_rows: int,
+    column_names: List[str],
+    num_duplicates: int,
+    missing_data: pd.Series,
+    dtypes: Dict[str, str],
+) -> BaseStats:
+    num_columns = len(column_names)
+    total_missing = int(missing_data.sum())
+    total_cells = num_rows * num_columns
+    missing_percentage = (total_missing / total_cells * 100) if total_cells else 0.0
+
+    columns_to_check = [col for col in column_names if col not in EXCLUDED_COLUMNS]
+
+    # إعادة استخدام missing_data بدل مسح كل عمود مرتين (isnull ثم notna)
+    checked_missing = missing_data.loc[columns_to_check]
+    cc_mask = checked_missing == 0
+    complete_columns = cc_mask.index[cc_mask].tolist()
+    complete_columns_count = len(complete_columns)
+
+    # مصفوفات جاهزة مسبقاً كي تبقى الحلقة حسابات Python صرفة بلا فهرسة pandas
+    md_arr = checked_missing.to_numpy()
+    dtype_arr = [dtypes[col] for col in columns_to_check]
+
+    all_columns: List[ColumnStatus] = []
+    for col, missing_count, dtype_str in zip(columns_to_check, md_arr, dtype_arr):
+        missing_count = int(missing_count)
+        complete_count = num_rows - missing_count
+        completion_rate = (complete_count / num_rows * 100) if num_rows else 0.0
+
+        all_columns.append(
+            ColumnStatus(
+                name=col,
+                is_complete=missing_count == 0,
+                complete_count=complete_count,
+                missing_count=missing_count,
+                completion_rate=completion_rate,
+                dtype=dtype_str,
+            )
+        )
+
+    # تصفية الأعمدة الخالية من النقص أولاً ثم الفرز: O(k log k) بدل O(C)
+    nonzero = missing_data[missing_data > 0].sort_values(ascending=False)
+    counts_arr = nonzero.to_numpy()
+    pcts = (
+        counts_arr * (100.0 / num_rows) if num_rows else np.zeros(len(nonzero))
+    )
+    missing_breakdown = [
+        MissingBreakdown(name=col, missing_count=int(count), percentage=float(pct))
+        for col, count, pct in zip(nonzero.index, counts_arr, pcts)
+    ]
+
+    return BaseStats(
+        num_rows=num_rows,
+        num_columns=num_columns,
+        num_duplicates=num_duplicates,
+        total_missing=total_missing,
+        missing_percentage=missing_percentage,
+        complete_columns_count=complete_columns_count,
+        complete_columns=complete_columns,
+        all_columns=all_columns,
+        column_names=list(column_names),
+        columns_to_check=columns_to_check,
+        dtypes=dtypes,
+        missing_breakdown=missing_breakdown,
+    )
+
+
+def missing_counts(df: pd.DataFrame) -> pd.Series:
+    float_cols = [col for col in df.columns if df[col].dtype.kind == "f"]
+    if _null_counts_kernel is None or len(float_cols) < 2:
+        return df.isnull().sum()
+
+    # الأعمدة العائمة تُكدّس في مصفوفة ثنائية وتُعدّ في النواة المصهورة،
+    # والبقية تبقى على مسار pandas
+    arr = df[float_cols].to_numpy(dtype=np.float64, na_value=np.nan)
+    float_counts = pd.Series(_null_counts_kernel(arr), index=float_cols)
+    other_cols = [col for col in df.columns if col not in float_cols]
+    other_counts = df[other_cols].isnull().sum()
+    return pd.concat([float_counts, other_counts]).reindex(df.columns)
+
+
+def compute_base_stats(df: pd.DataFrame) -> BaseStats:
+    return base_stats_from_counts(
+        num_rows=len(df),
+        column_names=df.columns.tolist(),
+        num_duplicates=count_duplicates(df),
+        missing_data=missing_counts(df),
+        dtypes={col: str(dtype) for col, dtype in df.dtypes.items()},
+    )
+
+
+def build_text_view(df: pd.DataFrame, columns_to_check: List[str]) -> pd.DataFrame:
+    # تحويل astype النصي يكلف تخصيص أعمدة كاملة؛ يُحسب مرة واحدة لكل رفع.
+    # خفض الحالة هنا أيضاً كي يعمل البحث لاحقاً بمطابقة حساسة للحالة
+    # دون طي حالة كل خلية في كل استعلام
+    return df[columns_to_check].astype("string[pyarrow]").apply(
+        lambda s: s.str.lower()
+    )
+
+
+# سقف أمثلة المطابقة المعروضة في الصفحة
+MAX_WORD_EXAMPLES = 10
+
+
+def search_word(
+    df: pd.DataFrame,
+    columns_to_check: List[str],
+    word_query: str,
+    text_df: Optional[pd.DataFrame] = None,
+) -> Tuple[List[WordResult], List[WordExample], int]:
+    num_rows = len(df)
+    lowered_word = word_query.lower()
+    word_results: List[WordResult] = []
+    word_examples: List[WordExample] = []
+    word_total_occurrences = 0
+
+    if not columns_to_check or not num_rows:
+        return word_results, word_examples, word_total_occurrences
+
+    # تمريرة واحدة متجهة على كل الأعمدة بدل حلقة عمود-بعمود
+    if text_df is None:
+        text_df = build_text_view(df, columns_to_check)
+    # النص مخفوض الحالة مسبقاً في build_text_view، فالمطابقة الحساسة تكفي
+    mask = text_df.apply(
+        lambda s: s.str.contains(lowered_word, na=False, regex=False)
+    )
+    counts = mask.sum(axis=0)
+    index_arr = df.index.to_numpy()
+    examples_budget = MAX_WORD_EXAMPLES
+
+    for col in columns_to_check:
+        count = int(counts[col])
+        if count > 0:
+            percentage = (count / num_rows * 100) if num_rows else 0.0
+            word_total_occurrences += count
+            word_results.append(
+                WordResult(name=col, count=count, percentage=percentage)
+            )
+            if examples_budget <= 0:
+                # اكتمل نصاب الأمثلة؛ تبقى العدادات فقط بلا تجسيد نصوص
+                continue
+            # مواضع أول ثلاث مطابقات مباشرة من القناع دون تجسيد إطار فرعي
+            positions = np.flatnonzero(mask[col].to_numpy(dtype=bool))[
+                : min(3, examples_budget)
+            ]
+            examples_budget -= len(positions)
+            values = df[col].to_numpy()[positions]
+            for idx, value in zip(index_arr[positions], values):
+                word_examples.append(
+                    WordExample(name=col, row_number=int(idx) + 1, value=str(value))
+                )
+
+    word_results.sort(key=lambda result: result.count, reverse=True)
+    return word_results, word_examples, word_total_occurrences
+
+
+# فاصل الترميز: أي محارف ليست حروفاً/أرقاماً
+_TOKEN_SPLIT_RE = re.compile(r"\W+", flags=re.UNICODE)
+
+# الاستعلام القابل للفهرسة لا يحوي فواصل، فلا يمكن أن يمتد عبر رمزين
+_INDEXABLE_QUERY_RE = re.compile(r"\w+", flags=re.UNICODE)
+
+# الاستعلامات الأقصر من ذلك تطابق رموزاً كثيرة جداً فلا يفيد الفهرس
+MIN_INDEXED_QUERY_LEN = 3
+
+# فهرس عمود واحد: رمز -> مواضع الصفوف الحاوية له
+ColumnWordIndex = Dict[str, Set[int]]
+
+
+def is_indexable_query(word_query: str) -> bool:
+    return (
+        len(word_query) >= MIN_INDEXED_QUERY_LEN
+        and _INDEXABLE_QUERY_RE.fullmatch(word_query) is not None
+    )
+
+
+def build_word_index(text_df: pd.DataFrame) -> Dict[str, ColumnWordIndex]:
+    # يُبنى مرة واحدة لكل رفع (في الخلفية)؛ بعدها تُجاب الاستعلامات
+    # المتكررة من الفهرس بدل مسح O(صفوف×أعمدة) عند كل ضغطة مفتاح
+    index: Dict[str, ColumnWordIndex] = {}
+    for col in text_df.columns:
+        col_index: ColumnWordIndex = {}
+        for pos, tokens in enumerate(
+            text_df[col].str.split(_TOKEN_SPLIT_RE.pattern, regex=True).tolist()
+        ):
+            if tokens is None or tokens is pd.NA:
+                continue
+            for token in set(tokens):
+                if token:
+                    col_index.setdefault(token, set()).add(pos)
+        index[col] = col_index
+    return index
+
+
+def search_word_indexed(
+    df: pd.DataFrame,
+    word_index: Dict[str, ColumnWordIndex],
+    columns_to_check: List[str],
+    word_query: str,
+) -> Tuple[List[WordResult], List[WordExample], int]:
+    num_rows = len(df)
+    lowered_word = word_query.lower()
+    word_results: List[WordResult] = []
+    word_examples: List[WordExample] = []
+    word_total_occurrences = 0
+
+    examples_budget = MAX_WORD_EXAMPLES
+
+    for col in columns_to_check:
+        col_index = word_index.get(col)
+        if not col_index:
+            continue
+        # اتحاد صفوف كل الرموز الحاوية للاستعلام كجزء
+        matched_rows: Set[int] = set()
+        for token, positions in col_index.items():
+            if lowered_word in token:
+                matched_rows.update(positions)
+        count = len(matched_rows)
+        if count > 0:
+            percentage = (count / num_rows * 100) if num_rows else 0.0
+            word_total_occurrences += count
+            word_results.append(
+                WordResult(name=col, count=count, percentage=percentage)
+            )
+            if examples_budget <= 0:
+                continue
+            taken = sorted(matched_rows)[: min(3, examples_budget)]
+            examples_budget -= len(taken)
+            for pos in taken:
+                idx = df.index[pos]
+                value = str(df[col].iloc[pos])
+                word_examples.append(
+                    WordExample(name=col, row_number=int(idx) + 1, value=value)
+                )
+
+    word_results.sort(key=lambda result: result.count, reverse=True)
+    return word_results, word_examples, word_total_occurrences
+
+
+def filter_columns(
+    all_columns: List[ColumnStatus], column_query: str
+) -> List[ColumnStatus]:
+    if not column_query:
+        return []
+    # مطابقة الأسماء دفعة واحدة بدل خفض حالة كل اسم داخل حلقة Python
+    name_index = pd.Index([status.name for status in all_columns])
+    name_mask = name_index.str.contains(column_query, case=False, regex=False)
+    return [status for status, matched in zip(all_columns, name_mask) if matched]
+
+
+def apply_queries(
+    df: pd.DataFrame,
+    base: BaseStats,
+    column_query: str = "",
+    word_query: str = "",
+    word_search: Optional[
+        Callable[[str], Tuple[List[WordResult], List[WordExample], int]]
+    ] = None,
+) -> DatasetStats:
+    filtered_columns = filter_columns(base.all_columns, column_query)
+
+    word_results: List[WordResult] = []
+    word_examples: List[WordExample] = []
+    word_total_occurrences = 0
+
+    if word_query:
+        if word_search is None:
+            word_results, word_examples, word_total_occurrences = search_word(
+                df, base.columns_to_check, word_query
+            )
+        else:
+            word_results, word_examples, word_total_occurrences = word_search(
+                word_query
+            )
+
+    return DatasetStats(
+        num_rows=base.num_rows,
+        num_columns=base.num_columns,
+        num_duplicates=base.num_duplicates,
+        total_missing=base.total_missing,
+        missing_percentage=base.missing_percentage,
+        complete_columns_count=base.complete_columns_count,
+        complete_columns=base.complete_columns,
+        all_columns=base.all_columns,
+        filtered_columns=filtered_columns,
+        column_names=base.column_names,
+        dtypes=base.dtypes,
+        missing_breakdown=base.missing_breakdown,
+        word_results=word_results,
+        word_examples=word_examples,
+        word_total_occurrences=word_total_occurrences,
+    )
@@ -1,12 +1,20 @@
+import gc
+import hashlib
 import os
+import tempfile
 import uuid
-from dataclasses import dataclass
-from typing import Dict, List, Optional
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from flask import (
     Flask,
     flash,
+    make_response,
     redirect,
     render_template,
     request,
@@ -14,55 +22,21 @@ from flask import (
     url_for,
 )
 
-
-@dataclass
-class ColumnStatus:
-    name: str
-    is_complete: bool
-    complete_count: int
-    missing_count: int
-    completion_rate: float
-    dtype: str
-
-
-@dataclass
-class WordResult:
-    name: str
-    count: int
-    percentage: float
-
-
-@dataclass
-class WordExample:
-    name: str
-    row_number: int
-    value: str
-
-
-@dataclass
-class MissingBreakdown:
-    name: str
-    missing_count: int
-    percentage: float
-
-
-@dataclass
-class DatasetStats:
-    num_rows: int
-    num_columns: int
-    num_duplicates: int
-    total_missing: int
-    missing_percentage: float
-    complete_columns_count: int
-    complete_columns: List[str]
-    all_columns: List[ColumnStatus]
-    filtered_columns: List[ColumnStatus]
-    column_names: List[str]
-    dtypes: Dict[str, str]
-    missing_breakdown: List[MissingBreakdown]
-    word_results: List[WordResult]
-    word_examples: List[WordExample]
-    word_total_occurrences: int
+from analyzer import (
+    BaseStats,
+    DatasetStats,
+    EXCLUDED_COLUMNS_DISPLAY,
+    WordExample,
+    WordResult,
+    apply_queries,
+    base_stats_from_counts,
+    build_text_view,
+    build_word_index,
+    compute_base_stats,
+    is_indexable_query,
+    search_word,
+    search_word_indexed,
+)
 
 
 def create_app() -> Flask:
@@ -79,144 +53,307 @@ def create_app() -> Flask:
 
 app = create_app()
 
-# تخزين البيانات لكل جلسة
-DATASETS: Dict[str, pd.DataFrame] = {}
+# الملفات المرفوعة تُخزّن على القرص بصيغة Parquet ويُعاد تحميلها عند الحاجة
+UPLOAD_DIR = os.environ.get(
+    "UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "analyzerdata_uploads")
+)
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+# أقصى عدد ملفات محتفظ بها في ذاكرة العامل في آن واحد
+MAX_CACHED_DATASETS = 32
+
+
+class _LRUDatasets(OrderedDict):
+    # قاموس محدود السعة: الجلسات المهجورة تُطرد من الذاكرة دون فقدان
+    # بياناتها لأن ملف Parquet يبقى على القرص ويُعاد تحميله عند الطلب
+
+    def __init__(self, maxsize: int) -> None:
+        super().__init__()
+        self.maxsize = maxsize
+
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __setitem__(self, key, value) -> None:
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        while len(self) > self.maxsize:
+            evicted, _ = self.popitem(last=False)
+            # تحرير الملحقات المرتبطة بالملف المطرود أيضاً
+            STATS_CACHE.pop(evicted, None)
+            TEXT_VIEWS.pop(evicted, None)
+            WORD_INDEXES.pop(evicted, None)
+            PREVIEW_CACHE.pop(evicted, None)
+
+
+# نسخة ساخنة في الذاكرة من الملفات المحمّلة حالياً
+DATASETS: _LRUDatasets = _LRUDatasets(MAX_CACHED_DATASETS)
+
+# الإحصائيات المستقلة عن الاستعلامات، محسوبة مرة واحدة لكل ملف مرفوع
+STATS_CACHE: Dict[str, BaseStats] = {}
+
+# نسخة نصية جاهزة من أعمدة الفحص لكل ملف، تُبنى مرة واحدة للبحث عن الكلمات
+TEXT_VIEWS: Dict[str, pd.DataFrame] = {}
+
+# فهرس الرموز المقلوب لكل ملف: يجيب الاستعلامات المتكررة دون مسح كامل
+WORD_INDEXES: Dict[str, Dict] = {}
+
+# معاينة HTML للصفوف الأولى؛ منسّق pandas بطيء فلا يُستدعى في كل طلب
+PREVIEW_CACHE: Dict[str, str] = {}
+
+# فئات جدول المعاينة في القالب
+PREVIEW_TABLE_CLASSES = "table table-striped table-bordered table-sm"
+
+# التحليل الثقيل يجري خارج خيط الطلب؛ نوى Arrow/NumPy تحرر قفل GIL
+EXECUTOR = ThreadPoolExecutor(max_workers=os.cpu_count())
 
-# الحقول المستثناة من حساب الأعمدة المكتملة
-EXCLUDED_COLUMNS = [
-    "CreatedAt",
-    "ModifiedAt",
-    "DeletedAt",
-    "IsDeleted",
-    "CreatedById",
-    "ModifiedById",
-    "DeletedById",
-    "Governorate",
-]
+# مهام التسخين المعلقة لكل ملف مرفوع (تحميل + إحصائيات أساسية)
+PRECOMPUTED: Dict[str, Future] = {}
+
+
+def _parquet_path(upload_id: str) -> str:
+    return os.path.join(UPLOAD_DIR, f"{upload_id}.parquet")
 
 
 def _get_dataset() -> Optional[pd.DataFrame]:
     upload_id = session.get("upload_id")
     if not upload_id:
         return None
-    return DATASETS.get(upload_id)
+    df = DATASETS.get(upload_id)
+    if df is None:
+        # إعادة التحميل من القرص بعد إعادة تشغيل العامل أو تحرير الذاكرة
+        path = _parquet_path(upload_id)
+        if os.path.exists(path):
+            df = pd.read_parquet(path, dtype_backend="pyarrow")
+            DATASETS[upload_id] = df
+    return df
+
+
+def _get_text_view(
+    df: pd.DataFrame,
+    columns_to_check: List[str],
+    upload_id: Optional[str] = None,
+) -> pd.DataFrame:
+    if upload_id:
+        text_df = TEXT_VIEWS.get(upload_id)
+        if text_df is not None:
+            return text_df
+    text_df = build_text_view(df, columns_to_check)
+    if upload_id:
+        TEXT_VIEWS[upload_id] = text_df
+    return text_df
+
+
+def _get_preview_html(df: pd.DataFrame, upload_id: Optional[str] = None) -> str:
+    if upload_id:
+        preview_html = PREVIEW_CACHE.get(upload_id)
+        if preview_html is not None:
+            return preview_html
+    preview_html = df.head(10).to_html(
+        classes=PREVIEW_TABLE_CLASSES, justify="center"
+    )
+    if upload_id:
+        PREVIEW_CACHE[upload_id] = preview_html
+    return preview_html
+
+
+@lru_cache(maxsize=64)
+def _word_search_cached(
+    upload_id: str, word_query: str
+) -> Tuple[List[WordResult], List[WordExample], int]:
+    # البحث عن الكلمة مكلف، لذلك نحفظ نتيجته لكل (معرف الملف، الكلمة)
+    df = DATASETS[upload_id]
+    base = STATS_CACHE[upload_id]
+
+    # الفهرس المقلوب يجيب الاستعلامات البسيطة دون مسح النص كله
+    word_index = WORD_INDEXES.get(upload_id)
+    if word_index is not None and is_indexable_query(word_query):
+        return search_word_indexed(
+            df, word_index, base.columns_to_check, word_query
+        )
+
+    text_df = _get_text_view(df, base.columns_to_check, upload_id)
+    return search_word(df, base.columns_to_check, word_query, text_df=text_df)
+
+
+def _warm_upload(upload_id: str) -> None:
+    # يعمل في الخلفية بعد الرفع: تحميل الإطار وحساب الإحصائيات قبل أول GET
+    path = _parquet_path(upload_id)
+    if upload_id not in DATASETS and os.path.exists(path):
+        DATASETS[upload_id] = pd.read_parquet(path, dtype_backend="pyarrow")
+    df = DATASETS.get(upload_id)
+    if df is not None:
+        if upload_id not in STATS_CACHE:
+            STATS_CACHE[upload_id] = compute_base_stats(df)
+        text_df = _get_text_view(
+            df, STATS_CACHE[upload_id].columns_to_check, upload_id
+        )
+        if upload_id not in WORD_INDEXES:
+            WORD_INDEXES[upload_id] = build_word_index(text_df)
+        _get_preview_html(df, upload_id)
+
+
+def _drop_upload(upload_id: str) -> None:
+    future = PRECOMPUTED.pop(upload_id, None)
+    if future is not None:
+        future.cancel()
+    DATASETS.pop(upload_id, None)
+    STATS_CACHE.pop(upload_id, None)
+    TEXT_VIEWS.pop(upload_id, None)
+    WORD_INDEXES.pop(upload_id, None)
+    PREVIEW_CACHE.pop(upload_id, None)
+    _word_search_cached.cache_clear()
+    try:
+        os.unlink(_parquet_path(upload_id))
+    except OSError:
+        pass
 
 
 def _set_dataset(df: pd.DataFrame) -> None:
     upload_id = str(uuid.uuid4())
-    # تنظيف التخزين في حال وجود معرف سابق
+    # تحرير الملف السابق وملحقاته بالكامل قبل ربط الجديد، كي لا يتضاعف
+    # ذروة استهلاك الذاكرة أثناء إعادة الرفع
     old_id = session.pop("upload_id", None)
-    if old_id and old_id in DATASETS:
-        DATASETS.pop(old_id, None)
+    if old_id:
+        _drop_upload(old_id)
+        gc.collect()
+    try:
+        df.to_parquet(_parquet_path(upload_id), compression="zstd")
+    except Exception:  # pylint: disable=broad-except
+        # بعض الأنواع المختلطة لا تُسلسل إلى Parquet؛ نكتفي حينها بالذاكرة
+        pass
     DATASETS[upload_id] = df
     session["upload_id"] = upload_id
+    PRECOMPUTED[upload_id] = EXECUTOR.submit(_warm_upload, upload_id)
 
 
 def _clear_dataset() -> None:
     upload_id = session.pop("upload_id", None)
     if upload_id:
-        DATASETS.pop(upload_id, None)
+        _drop_upload(upload_id)
 
 
-def analyze_dataframe(
-    df: pd.DataFrame, column_query: str = "", word_query: str = ""
-) -> DatasetStats:
-    num_rows, num_columns = df.shape
-    num_duplicates = int(df.duplicated().sum())
-
-    missing_data = df.isnull().sum()
-    total_missing = int(missing_data.sum())
-    total_cells = num_rows * num_columns
-    missing_percentage = (total_missing / total_cells * 100) if total_cells else 0.0
-
-    columns_to_check = [col for col in df.columns if col not in EXCLUDED_COLUMNS]
-    complete_columns = [col for col in columns_to_check if df[col].notna().all()]
-    complete_columns_count = len(complete_columns)
-
-    all_columns: List[ColumnStatus] = []
-    for col in columns_to_check:
-        series = df[col]
-        missing_count = int(series.isnull().sum())
-        complete_count = int(series.notna().sum())
-        completion_rate = (complete_count / num_rows * 100) if num_rows else 0.0
-
-        all_columns.append(
-            ColumnStatus(
-                name=col,
-                is_complete=missing_count == 0,
-                complete_count=complete_count,
-                missing_count=missing_count,
-                completion_rate=completion_rate,
-                dtype=str(series.dtype),
+# حجم القطعة عند تحليل CSV بالتدفق
+CSV_CHUNK_SIZE = 100_000
+
+
+def _ingest_csv(file) -> int:
+    # قراءة الملف قطعةً قطعة: الذاكرة O(قطعة) بدل O(ملف)، والإحصائيات
+    # الأساسية تتراكم أثناء الكتابة إلى Parquet فلا حاجة لمسح ثانٍ
+    upload_id = str(uuid.uuid4())
+    path = _parquet_path(upload_id)
+    writer = None
+    try:
+        row_count = 0
+        null_counts: Optional[pd.Series] = None
+        dtypes: Dict[str, str] = {}
+        seen_hashes: set = set()
+        schema = None
+        column_names: List[str] = []
+
+        # يبقى القارئ مربوطاً بمتغير محلي كي لا يُغلق ملف الرفع عند انهيار
+        # التكرار في منتصفه، فيظل مسار القراءة الكاملة الاحتياطي ممكناً
+        reader = pd.read_csv(file, chunksize=CSV_CHUNK_SIZE, dtype_backend="pyarrow")
+        for chunk in reader:
+            row_count += len(chunk)
+            chunk_nulls = chunk.isnull().sum()
+            null_counts = (
+                chunk_nulls
+                if null_counts is None
+                else null_counts.add(chunk_nulls, fill_value=0)
             )
-        )
+            dtypes.update((col, str(dtype)) for col, dtype in chunk.dtypes.items())
+            column_names = chunk.columns.tolist()
+            # عدّ التكرارات عبر القطع من خلال بصمات الصفوف
+            seen_hashes.update(pd.util.hash_pandas_object(chunk, index=False).tolist())
+
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                schema = table.schema
+                writer = pq.ParquetWriter(path, schema, compression="zstd")
+            elif table.schema != schema:
+                table = table.cast(schema)
+            writer.write_table(table)
+    except Exception:  # pylint: disable=broad-except
+        # القطع غير المتجانسة أو الملفات غير النظامية تعود للمسار الكامل
+        if writer is not None:
+            writer.close()
+            writer = None
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        file.seek(0)
+        try:
+            df = pd.read_csv(file, engine="pyarrow", dtype_backend="pyarrow")
+        except Exception:  # pylint: disable=broad-except
+            file.seek(0)
+            df = pd.read_csv(file)
+        if df.empty:
+            return 0
+        _set_dataset(df)
+        return len(df)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if row_count == 0:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        return 0
 
-    filtered_columns = (
-        [
-            status
-            for status in all_columns
-            if column_query.lower() in status.name.lower()
-        ]
-        if column_query
-        else []
+    # تحرير الملف السابق قبل تسجيل الجديد حفاظاً على سقف الذاكرة
+    old_id = session.pop("upload_id", None)
+    if old_id:
+        _drop_upload(old_id)
+        gc.collect()
+    STATS_CACHE[upload_id] = base_stats_from_counts(
+        num_rows=row_count,
+        column_names=column_names,
+        num_duplicates=row_count - len(seen_hashes),
+        missing_data=null_counts.astype("int64"),
+        dtypes=dtypes,
     )
+    session["upload_id"] = upload_id
+    PRECOMPUTED[upload_id] = EXECUTOR.submit(_warm_upload, upload_id)
+    return row_count
 
-    missing_breakdown = [
-        MissingBreakdown(
-            name=col,
-            missing_count=int(count),
-            percentage=((count / num_rows) * 100) if num_rows else 0.0,
-        )
-        for col, count in missing_data.items()
-        if count > 0
-    ]
-    missing_breakdown.sort(key=lambda item: item.missing_count, reverse=True)
-
-    word_results: List[WordResult] = []
-    word_examples: List[WordExample] = []
-    word_total_occurrences = 0
-
-    if word_query:
-        lowered_word = word_query.lower()
-        for col in columns_to_check:
-            series_text = df[col].astype(str)
-            matches = series_text.str.contains(
-                lowered_word, case=False, na=False, regex=False
-            )
-            count = int(matches.sum())
-            if count > 0:
-                percentage = (count / num_rows * 100) if num_rows else 0.0
-                word_total_occurrences += count
-                word_results.append(
-                    WordResult(name=col, count=count, percentage=percentage)
-                )
-
-                matched_indices = df.loc[matches].index[:3].tolist()
-                for idx in matched_indices:
-                    value = str(df.loc[idx, col])
-                    word_examples.append(
-                        WordExample(name=col, row_number=int(idx) + 1, value=value)
-                    )
-
-        word_results.sort(key=lambda result: result.count, reverse=True)
-        word_examples = word_examples[:10]
-
-    return DatasetStats(
-        num_rows=num_rows,
-        num_columns=num_columns,
-        num_duplicates=num_duplicates,
-        total_missing=total_missing,
-        missing_percentage=missing_percentage,
-        complete_columns_count=complete_columns_count,
-        complete_columns=complete_columns,
-        all_columns=all_columns,
-        filtered_columns=filtered_columns,
-        column_names=df.columns.tolist(),
-        dtypes={col: str(dtype) for col, dtype in df.dtypes.items()},
-        missing_breakdown=missing_breakdown,
-        word_results=word_results,
-        word_examples=word_examples,
-        word_total_occurrences=word_total_occurrences,
+
+def analyze_dataframe(
+    df: pd.DataFrame,
+    column_query: str = "",
+    word_query: str = "",
+    upload_id: Optional[str] = None,
+) -> DatasetStats:
+    # الإحصائيات الأساسية لا تتغير بتغير الاستعلامات، فتحسب مرة واحدة لكل رفع
+    base = None
+    if upload_id:
+        base = STATS_CACHE.get(upload_id)
+    if base is None:
+        base = compute_base_stats(df)
+        if upload_id:
+            STATS_CACHE[upload_id] = base
+
+    word_search = None
+    if upload_id and upload_id in DATASETS and upload_id in STATS_CACHE:
+        word_search = lambda word: _word_search_cached(upload_id, word)  # noqa: E731
+
+    return apply_queries(
+        df,
+        base,
+        column_query=column_query,
+        word_query=word_query,
+        word_search=word_search,
     )
 
 
@@ -233,40 +370,70 @@ def index():
             return redirect(url_for("index"))
 
         try:
-            df = pd.read_csv(file)
+            num_rows = _ingest_csv(file)
         except Exception as exc:  # pylint: disable=broad-except
             flash(f"تعذّر قراءة الملف: {exc}", "danger")
             return redirect(url_for("index"))
 
-        if df.empty:
+        if num_rows == 0:
             flash("الملف لا يحتوي على بيانات.", "warning")
             return redirect(url_for("index"))
 
-        _set_dataset(df)
         flash("تم رفع الملف وتحليله بنجاح.", "success")
         return redirect(url_for("index"))
 
+    upload_id = session.get("upload_id")
+    column_query = request.args.get("column_search", "").strip()
+    word_query = request.args.get("word_search", "").strip()
+
+    # المحتوى لا يتغير ما دام (الملف، الاستعلامان) ثابتاً: نرد 304 بلا أي عمل
+    etag = hashlib.blake2b(
+        f"{upload_id}|{column_query}|{word_query}".encode(), digest_size=16
+    ).hexdigest()
+    # مقارنة ضعيفة: إعادة التحقق من المتصفح لا تتطلب تطابقاً بايتياً للرد
+    if "_flashes" not in session and request.if_none_match.contains_weak(etag):
+        return "", 304
+
+    if upload_id:
+        # انتظار مهمة التسخين إن كانت لا تزال قيد التنفيذ
+        future = PRECOMPUTED.pop(upload_id, None)
+        if future is not None:
+            try:
+                future.result()
+            except Exception:  # pylint: disable=broad-except
+                pass
+
     df = _get_dataset()
     stats = None
     preview_html = None
 
-    column_query = request.args.get("column_search", "").strip()
-    word_query = request.args.get("word_search", "").strip()
-
     if df is not None:
-        stats = analyze_dataframe(df, column_query=column_query, word_query=word_query)
-        preview_html = df.head(10).to_html(
-            classes="table table-striped table-bordered table-sm", justify="center"
+        # تنفيذ التحليل في حوض الخيوط بدل خيط الطلب
+        stats = EXECUTOR.submit(
+            analyze_dataframe,
+            df,
+            column_query,
+            word_query,
+            upload_id,
+        ).result()
+        preview_html = _get_preview_html(df, upload_id)
+
+    # القالب يستهلك رسائل flash أثناء العرض؛ نسجل وجودها قبل ذلك كي لا
+    # نمنح الصفحات الحاملة لها ETag فتُعاد من ذاكرة المتصفح إلى الأبد
+    had_flashes = "_flashes" in session
+    response = make_response(
+        render_template(
+            "index.html",
+            stats=stats,
+            preview_html=preview_html,
+            column_query=column_query,
+            word_query=word_query,
+            excluded_columns=EXCLUDED_COLUMNS_DISPLAY,
         )
-
-    return render_template(
-        "index.html",
-        stats=stats,
-        preview_html=preview_html,
-        column_query=column_query,
-        word_query=word_query,
-        excluded_columns=EXCLUDED_COLUMNS,
     )
+    if not had_flashes:
+        response.set_etag(etag)
+    return response
 
 
 @app.route("/reset")
@@ -278,4 +445,3 @@ def reset():
 
 if __name__ == "__main__":
     app.run(debug=True, port=int(os.environ.get("PORT", 8501)))
-